@@ -1,11 +1,35 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field, replace
+from collections import deque
+from functools import lru_cache
 from typing import Dict, List, Tuple, Callable, Iterable, Optional
-import operator
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:  # numba is optional; without it the pure-Python search is used
+    np = None
+    njit = None
 
 Val = int
 Assignment = Dict[str, Val]
 
+# Constraint kinds. KIND_PRED is any Constraint built directly from a predicate.
+KIND_PRED, KIND_NEQ, KIND_BIN, KIND_ALLDIFF, KIND_IN, KIND_TABLE, KIND_ADD10 = range(7)
+# sum([...]) op K gets one kind per op so checks compare natively instead of calling operator.*
+KIND_SUM_EQ, KIND_SUM_NE, KIND_SUM_LT, KIND_SUM_LE, KIND_SUM_GT, KIND_SUM_GE = range(7, 13)
+SUM_KINDS = {"==": KIND_SUM_EQ, "!=": KIND_SUM_NE, "<": KIND_SUM_LT,
+             "<=": KIND_SUM_LE, ">": KIND_SUM_GT, ">=": KIND_SUM_GE}
+
+def _sum_ok(kind: int, total: int, k: int) -> bool:
+    if kind == KIND_SUM_EQ: return total == k
+    if kind == KIND_SUM_NE: return total != k
+    if kind == KIND_SUM_LT: return total < k
+    if kind == KIND_SUM_LE: return total <= k
+    if kind == KIND_SUM_GT: return total > k
+    return total >= k
+
 @dataclass
 class CSP:
     domains: Dict[str, List[Val]]
@@ -16,46 +40,306 @@ class Constraint:
     scope: Tuple[str, ...]
     pred: Callable[[Assignment], bool]
     pretty: str
+    kind: int = KIND_PRED
+    # Typed payload; which fields are used depends on kind
+    op: Optional[Callable[[int, int], bool]] = field(default=None, repr=False)  # KIND_BIN
+    opname: str = ""                                     # KIND_BIN: eq, lt, ...; sums: ==, <=, ...
+    k: int = 0                                           # sum right-hand side
+    allowed: frozenset = field(default=frozenset(), repr=False)  # KIND_IN values, KIND_TABLE tuples
+    # The rest is set on the copy bind() returns, where values are interned bit
+    # positions (see _intern_values) and values[p] maps one back.
+    mask: int = 0                                        # KIND_IN allowed values
+    table: frozenset = field(default=frozenset(), repr=False)  # KIND_TABLE allowed tuples, packed
+    width: int = 0                                       # KIND_TABLE bits per packed value
+    # KIND_TABLE: columns[p] = values seen at position p; supports[p] maps the other
+    # positions' values (packed) to the allowed values at p
+    columns: Tuple[int, ...] = field(default=(), repr=False)
+    supports: List[Dict[int, int]] = field(default_factory=list, repr=False)
+    values: List[int] = field(default_factory=list, repr=False)
+    idx: Tuple[int, ...] = field(default=(), repr=False)
+    uidx: Tuple[int, ...] = field(default=(), repr=False)
+    # sums: memoized check of the scope's sum against k, keyed on its value positions
+    memo: Optional[Callable[[Tuple[int, ...]], bool]] = field(default=None, repr=False)
+
+    def bind(self, name2idx: Dict[str, int], values: List[int], val2pos: Dict[int, int]) -> Constraint:
+        """A copy with the scope interned through name2idx and the payload over the
+           value positions of val2pos (and a fresh memo for sums). The parsed constraint
+           is left alone, so solves with different numberings can share it."""
+        idx = tuple(name2idx[v] for v in self.scope)
+        kind, payload = self.kind, {}
+        if kind >= KIND_SUM_EQ:
+            k = self.k
+            payload["memo"] = lru_cache(maxsize=4096)(lambda ps: _sum_ok(kind, sum(values[p] for p in ps), k))
+        elif kind == KIND_IN:
+            payload["mask"] = to_mask(val2pos[x] for x in self.allowed if x in val2pos)
+        elif kind == KIND_TABLE:
+            payload.update(_pack_table(self.allowed, len(idx), val2pos))
+        elif kind == KIND_BIN and self.opname not in _BIN_OPS:
+            # positions are ordered like the values, so only unknown ops need the values back
+            op = self.op
+            payload["op"] = lambda x, y: op(values[x], values[y])
+        return replace(self, idx=idx, uidx=tuple(dict.fromkeys(idx)), values=values, **payload)
+
+    def check_fast(self, a: array, just_assigned: int = -1) -> bool:
+        """Index-based pred over an assignment array (-1 = unassigned)."""
+        k = self.kind
+        i = self.idx
+        if k == KIND_NEQ:
+            x, y = a[i[0]], a[i[1]]
+            return x < 0 or y < 0 or x != y
+        if k == KIND_ALLDIFF:
+            if just_assigned >= 0 and len(i) == len(self.uidx):
+                # the rest of the scope was already distinct (not so if a variable repeats)
+                x = a[just_assigned]
+                for j in i:
+                    if j != just_assigned and a[j] == x:
+                        return False
+                return True
+            seen = 0
+            for j in i:
+                x = a[j]
+                if x >= 0:
+                    b = 1 << x
+                    if seen & b:
+                        return False
+                    seen |= b
+            return True
+        if k == KIND_IN:
+            x = a[i[0]]
+            return x < 0 or (self.mask >> x) & 1 == 1
+        if k == KIND_BIN:
+            x, y = a[i[0]], a[i[1]]
+            return x < 0 or y < 0 or self.op(x, y)
+        if k == KIND_TABLE:
+            key, shift, width, cols = 0, 0, self.width, self.columns
+            seen = True
+            for p, j in enumerate(i):
+                x = a[j]
+                if x < 0:
+                    return True
+                # a value never seen in its column can't be in any tuple: skip the hash lookup
+                seen = seen and (cols[p] >> x) & 1 == 1
+                key |= x << shift
+                shift += width
+            return seen and key in self.table
+        vals = tuple(a[j] for j in i)
+        values = self.values
+        if k == KIND_PRED:
+            return self.pred({v: values[x] for v, x in zip(self.scope, vals) if x >= 0})
+        if min(vals) < 0:
+            return True
+        if k >= KIND_SUM_EQ:
+            return self.memo(vals)
+        x, y, cin, z, cout = (values[p] for p in vals)
+        return x + y + cin == 10 * cout + z
+
+    def propagate(self, masks: List[int], a: array, v: int, saved: List[Tuple[int, int]]) -> bool:
+        """Forward check after v was assigned (v = -1 for the root pass): prune the masks of
+           unassigned scope vars, recording (var_idx, old_mask) in saved. False on wipeout."""
+        k = self.kind
+        i = self.idx
+        if k == KIND_NEQ:
+            x, y = a[i[0]], a[i[1]]
+            if x >= 0 and y < 0:
+                return _revise(masks, i[1], ~(1 << x), saved)
+            if y >= 0 and x < 0:
+                return _revise(masks, i[0], ~(1 << y), saved)
+            return True
+        if k == KIND_ALLDIFF:
+            if v < 0:
+                return True
+            drop = ~(1 << a[v])
+            for w in i:
+                if a[w] < 0 and not _revise(masks, w, drop, saved):
+                    return False
+            return True
+        if k == KIND_IN:
+            return a[i[0]] >= 0 or _revise(masks, i[0], self.mask, saved)
+        if k == KIND_TABLE and v < 0:
+            # root: every var can only take values found in its column(s)
+            for p, j in enumerate(i):
+                if a[j] < 0 and not _revise(masks, j, self.columns[p], saved):
+                    return False
+
+        # Everything else: once a single var of the scope is unassigned, keep its supported values
+        free = -1
+        for j in self.uidx:
+            if a[j] < 0:
+                if free >= 0:
+                    return True
+                free = j
+        if free < 0:
+            return True
+        if k == KIND_TABLE and len(self.uidx) == len(i):
+            key, shift, width = 0, 0, self.width
+            for j in i:
+                if j != free:
+                    key |= a[j] << shift
+                    shift += width
+            return _revise(masks, free, self.supports[i.index(free)].get(key, 0), saved)
+
+        # Candidates are evaluated in closed form; the assignment array is never written
+        allowed = 0
+        if k >= KIND_SUM_EQ or k == KIND_ADD10:
+            # sum(coef * val) over the scope is linear in the free var's value x
+            coefs = (1, 1, 1, -1, -10) if k == KIND_ADD10 else (1,) * len(i)
+            values = self.values
+            cx = rest = 0
+            for j, cf in zip(i, coefs):
+                if j == free:
+                    cx += cf
+                else:
+                    rest += cf * values[a[j]]
+            for x in mask_values(masks[free]):
+                total = rest + cx * values[x]
+                if (total == 0 if k == KIND_ADD10 else _sum_ok(k, total, self.k)):
+                    allowed |= 1 << x
+        elif k == KIND_BIN:
+            ax, ay = a[i[0]], a[i[1]]
+            for x in mask_values(masks[free]):
+                if self.op(x if i[0] == free else ax, x if i[1] == free else ay):
+                    allowed |= 1 << x
+        elif k == KIND_TABLE:
+            width = self.width
+            for x in mask_values(masks[free]):
+                key = 0
+                for p, j in enumerate(i):
+                    key |= (x if j == free else a[j]) << (width * p)
+                if key in self.table:
+                    allowed |= 1 << x
+        else:
+            values = self.values
+            part = {name: values[a[j]] for name, j in zip(self.scope, i) if j != free}
+            name = self.scope[i.index(free)]
+            for x in mask_values(masks[free]):
+                part[name] = values[x]
+                if self.pred(part):
+                    allowed |= 1 << x
+        return _revise(masks, free, allowed, saved)
+
+# ---------- Bitmask helpers (bit p set iff value values[p] still possible) ----------
+def _intern_values(csp: CSP) -> Tuple[List[int], Dict[int, int]]:
+    """Intern domain values like variables: the sorted distinct values, and value -> bit
+       position. Masks stay as wide as the number of distinct values however large or
+       negative they are, and positions compare in the same order as their values."""
+    values = sorted({x for ds in csp.domains.values() for x in ds})
+    return values, {x: p for p, x in enumerate(values)}
+
+def to_mask(positions: Iterable[int]) -> int:
+    m = 0
+    for p in positions:
+        m |= 1 << p
+    return m
+
+def mask_values(m: int) -> Iterable[int]:
+    """Yield the bit positions set in mask m, smallest first."""
+    while m:
+        low = m & -m
+        yield low.bit_length() - 1
+        m ^= low
+
+def mask_array(masks: List[int]):
+    """Store masks contiguously as machine words ('I', else 'Q') when they fit;
+       larger domains keep the plain list of ints."""
+    hi = max((m.bit_length() for m in masks), default=0)
+    for code in ("I", "Q"):
+        if hi <= 8 * array(code).itemsize:
+            return array(code, masks)
+    return masks
+
+def _revise(masks: List[int], w: int, allowed: int, saved: List[Tuple[int, int]]) -> bool:
+    m = masks[w]
+    nm = m & allowed
+    if nm != m:
+        saved.append((w, m))
+        masks[w] = nm
+    return nm != 0
+
+# binary op names from the parser, indexed by the opcode _bin_ok takes
+_BIN_OPS = ("eq", "neq", "lt", "le", "gt", "ge")
+
+def _bin_ok(op, a, b):
+    if op == 0: return a == b
+    if op == 1: return a != b
+    if op == 2: return a < b
+    if op == 3: return a <= b
+    if op == 4: return a > b
+    return a >= b
+
+def unary_mask(c: Constraint, m: int, values: List[int], x: Optional[str] = None) -> int:
+    """The positions of mask m whose values c allows for x (default: its first variable)
+       while no other variable is assigned. c_in is a set lookup; other kinds are
+       evaluated value by value."""
+    if x is None:
+        x = c.scope[0]
+    allowed = 0
+    for p in mask_values(m):
+        if (values[p] in c.allowed) if c.kind == KIND_IN else c.pred({x: values[p]}):
+            allowed |= 1 << p
+    return allowed
+
+def _rejects_alone(c: Constraint) -> bool:
+    """Whether c can reject a value while no other variable is assigned: unary constraints,
+       alldiffs that repeat a variable, and opaque predicates. The builders' other kinds
+       wait for a second variable."""
+    distinct = len(set(c.scope))
+    return distinct == 1 or c.kind == KIND_PRED or (c.kind == KIND_ALLDIFF and distinct != len(c.scope))
 
 # ---------- Constraint builders ----------
 def c_alldiff(vars: List[str]) -> Constraint:
     def pred(a: Assignment) -> bool:
         vals = [a[v] for v in vars if v in a]
         return len(vals) == len(set(vals))
-    return Constraint(tuple(vars), pred, f"alldiff({','.join(vars)})")
+    return Constraint(tuple(vars), pred, f"alldiff({','.join(vars)})", KIND_ALLDIFF)
 
 def c_bin(op: Callable[[int,int], bool], x: str, y: str, opname: str) -> Constraint:
     def pred(a: Assignment) -> bool:
         if x in a and y in a:
             return op(a[x], a[y])
         return True
-    return Constraint((x,y), pred, f"{opname}({x},{y})")
+    kind = KIND_NEQ if opname == "neq" and x != y else KIND_BIN
+    return Constraint((x,y), pred, f"{opname}({x},{y})", kind, op=op, opname=opname)
 
 def c_in(x: str, allowed: List[int]) -> Constraint:
     def pred(a: Assignment) -> bool:
         return (x not in a) or (a[x] in allowed)
-    return Constraint((x,), pred, f"in({x},{allowed})")
+    return Constraint((x,), pred, f"in({x},{allowed})", KIND_IN, allowed=frozenset(allowed))
 
 def c_sum(vars: List[str], opstr: str, k: int) -> Constraint:
-    opmap = {"==": operator.eq, "!=": operator.ne, "<=": operator.le,
-             "<": operator.lt, ">=": operator.ge, ">": operator.gt}
-    if opstr not in opmap: raise ValueError(f"bad sum op {opstr}")
-    opf = opmap[opstr]
+    if opstr not in SUM_KINDS: raise ValueError(f"bad sum op {opstr}")
+    kind = SUM_KINDS[opstr]
     def pred(a: Assignment) -> bool:
         # Accept partial assignments; only check when fully assigned
         if not all(v in a for v in vars):
             return True
-        return opf(sum(a[v] for v in vars), k)
-    return Constraint(tuple(vars), pred, f"sum({vars}) {opstr} {k}")
+        return _sum_ok(kind, sum(a[v] for v in vars), k)
+    return Constraint(tuple(vars), pred, f"sum({vars}) {opstr} {k}", kind, opname=opstr, k=k)
+
+def _pack_table(allowed: frozenset, arity: int, val2pos: Dict[int, int]) -> Dict[str, object]:
+    """bind()'s payload for a table: tuples of the right length over domain values become
+       positions packed `width` bits per value into one int, so a lookup hashes a single
+       int instead of building a tuple."""
+    rows = [tuple(val2pos[x] for x in t) for t in allowed
+            if len(t) == arity and all(x in val2pos for x in t)]
+    width = max((x.bit_length() for t in rows for x in t), default=1) or 1
+    def pack(ps: Iterable[int]) -> int:
+        return sum(x << (width * p) for p, x in enumerate(ps))
+    supports: List[Dict[int, int]] = [{} for _ in range(arity)]
+    for t in rows:
+        for p, s in enumerate(supports):
+            key = pack(t[:p] + t[p+1:])
+            s[key] = s.get(key, 0) | (1 << t[p])
+    return {"table": frozenset(pack(t) for t in rows), "width": width, "supports": supports,
+            "columns": tuple(to_mask(t[p] for t in rows) for p in range(arity))}
 
 def c_table(vars: List[str], allowed: List[Tuple[int, ...]]) -> Constraint:
-    allowed_set = set(tuple(t) for t in allowed)
+    allowed_set = frozenset(tuple(t) for t in allowed)
     def pred(a: Assignment) -> bool:
-        if all(v in a for v in vars):
-            tup = tuple(a[v] for v in vars)
-            return tup in allowed_set
-        return True
-    return Constraint(tuple(vars), pred, f"table({vars}) allowed {allowed}")
+        if not all(v in a for v in vars):
+            return True
+        return tuple(a[v] for v in vars) in allowed_set
+    return Constraint(tuple(vars), pred, f"table({vars}) allowed {allowed}", KIND_TABLE,
+                      allowed=allowed_set)
 
 def c_add10(x: str, y: str, cin: str, z: str, cout: str) -> Constraint:
     """Digit-wise base-10 addition: x + y + cin = 10*cout + z, where cin, cout in {0,1} and x,y,z in 0..9.
@@ -66,7 +350,119 @@ def c_add10(x: str, y: str, cin: str, z: str, cout: str) -> Constraint:
         if all(v in a for v in scope):
             return (a[x] + a[y] + a[cin]) == 10 * a[cout] + a[z]
         return True
-    return Constraint(scope, pred, f"add10({x},{y},{cin}->{z},{cout})")
+    return Constraint(scope, pred, f"add10({x},{y},{cin}->{z},{cout})", KIND_ADD10)
+
+
+# ---------- Struct-of-arrays constraint layout ----------
+def _check_cost(kind: int) -> int:
+    """Static rank used to order local checks: unary in(), binary, alldiff, add10,
+       then sums/tables/predicates (the most expensive)."""
+    if kind == KIND_IN: return 0
+    if kind == KIND_NEQ or kind == KIND_BIN: return 1
+    if kind == KIND_ALLDIFF: return 2
+    if kind == KIND_ADD10: return 3
+    return 4
+
+def _soa_by_var(constraints: List[Constraint], n: int) -> Tuple[List[array], List[array]]:
+    """For each var index i, parallel arrays kinds_by_var[i] ('b') and args_by_var[i]
+       ('q', 4 per constraint) for the bound constraints touching i. Rows are
+       NEQ/BIN (x, y, opcode, c) and IN (x, mask, 0, c); other kinds only use c, the
+       index into `constraints`. The Constraint objects (pretty, closures) stay cold
+       and are only touched for kinds without a fast row, which are tagged KIND_PRED.
+    """
+    kinds_by_var = [array("b") for _ in range(n)]
+    args_by_var = [array("q") for _ in range(n)]
+    # rows start in _check_cost order so cheap, restrictive checks short-circuit first
+    for ci in sorted(range(len(constraints)), key=lambda ci: _check_cost(constraints[ci].kind)):
+        c = constraints[ci]
+        kind, row = c.kind, (0, 0, 0, ci)
+        if kind in (KIND_NEQ, KIND_BIN):
+            opcode = _BIN_OPS.index(c.opname) if c.opname in _BIN_OPS else -1
+            if opcode < 0:
+                kind = KIND_PRED
+            row = (c.idx[0], c.idx[1], opcode, ci)
+        elif kind == KIND_IN:
+            if c.mask >= 1 << 63:
+                kind = KIND_PRED
+            row = (c.idx[0], c.mask if kind == KIND_IN else 0, 0, ci)
+        # an alldiff that repeats a variable needs check_fast's full scan
+        elif kind != KIND_ALLDIFF or len(c.uidx) != len(c.idx):
+            kind = KIND_PRED
+        for i in c.uidx:
+            kinds_by_var[i].append(kind)
+            args_by_var[i].extend(row)
+    return kinds_by_var, args_by_var
+
+# ---------- AC-3 preprocessing ----------
+def ac3(csp: CSP) -> bool:
+    """Make csp.domains node- and arc-consistent, narrowing them in place.
+       Constraints over two variables become arcs and alldiff is expanded to pairwise !=.
+       Returns False if some domain is wiped out.
+    """
+    idx2name = list(csp.domains.keys())
+    name2idx = {v: i for i, v in enumerate(idx2name)}
+    values, val2pos = _intern_values(csp)
+    masks = [to_mask(val2pos[x] for x in csp.domains[v]) for v in idx2name]
+
+    # (xi, xj) -> relations r(a, b) that a value a of xi needs a support b of xj for;
+    # None stands for != and is revised bitwise.
+    arcs: Dict[Tuple[int, int], List[Optional[Callable[[int, int], bool]]]] = {}
+    for c in csp.constraints:
+        if any(v not in name2idx for v in c.scope):
+            continue
+        idxs = [name2idx[v] for v in c.scope]
+        if len(set(idxs)) == 1:
+            # node consistency: unary givens are what AC-3 propagates from
+            masks[idxs[0]] &= unary_mask(c, masks[idxs[0]], values)
+        elif c.kind == KIND_ALLDIFF:
+            for xi in idxs:
+                for xj in idxs:
+                    if xi != xj:
+                        arcs.setdefault((xi, xj), []).append(None)
+        elif len(set(idxs)) == 2:
+            x, y = dict.fromkeys(c.scope)
+            xi, xj = name2idx[x], name2idx[y]
+            neq = c.kind == KIND_NEQ
+            arcs.setdefault((xi, xj), []).append(None if neq else (lambda a, b, c=c, x=x, y=y: c.pred({x: values[a], y: values[b]})))
+            arcs.setdefault((xj, xi), []).append(None if neq else (lambda a, b, c=c, x=x, y=y: c.pred({x: values[b], y: values[a]})))
+
+    def revise(xi: int, xj: int) -> bool:
+        m = masks[xi]
+        for rel in arcs[(xi, xj)]:
+            mj = masks[xj]
+            if rel is None:
+                # a has a != support unless D[xj] is exactly {a}
+                if mj & (mj - 1) == 0:
+                    m &= ~mj
+            else:
+                for a in mask_values(m):
+                    if not any(rel(a, b) for b in mask_values(mj)):
+                        m &= ~(1 << a)
+        if m != masks[xi]:
+            masks[xi] = m
+            return True
+        return False
+
+    into: Dict[int, List[int]] = {}
+    for xk, xi in arcs:
+        into.setdefault(xi, []).append(xk)
+    worklist = deque(arcs)
+    queued = set(arcs)
+    ok = all(masks)
+    while worklist and ok:
+        xi, xj = worklist.popleft()
+        queued.discard((xi, xj))
+        if revise(xi, xj):
+            if masks[xi] == 0:
+                ok = False
+                break
+            for xk in into.get(xi, ()):
+                if xk != xj and (xk, xi) not in queued:
+                    worklist.append((xk, xi)); queued.add((xk, xi))
+
+    for i, v in enumerate(idx2name):
+        csp.domains[v] = [val for val in csp.domains[v] if (masks[i] >> val2pos[val]) & 1]
+    return ok
 
 
 # You must extend the solver by implementing at least one of the following heuristics:
@@ -85,68 +481,38 @@ def consistent_with_local(cons_by_var: Dict[str, List[Constraint]], v: str, a: A
     return True
 
 def hurrestic(csp: CSP, tieBreaker: bool):
-    # Copy domains
-    domains = {v: list(ds) for v, ds in csp.domains.items()}
-    cons_by_var: Dict[str, List[Constraint]] = {v: [] for v in domains}
-    assignment: Assignment = {}
-
-    # Track number of consistent values for each variable
-    total_possible_moves: Dict[str, int] = {v: 0 for v in domains}
+    # Domains as bitmasks; nothing is removed from them here, so no list copies
+    values, val2pos = _intern_values(csp)
+    allowed = {v: to_mask(val2pos[x] for x in ds) for v, ds in csp.domains.items()}
+    degree: Dict[str, int] = {v: 0 for v in allowed}
 
-    # Build constraint lookup
+    # One pass over the constraints: count each variable's degree and fold in the
+    # constraints that can reject one of its values with nothing else assigned, so
+    # legal = popcount(domain & those masks).
     for c in csp.constraints:
         for v in c.scope:
-            cons_by_var[v].append(c)
-
-    # Count consistent values for each variable
-    for v in domains:
-        for val in domains[v]:
-            assignment[v] = val
-            if consistent_with_local(cons_by_var, v, assignment):
-                total_possible_moves[v] += 1
-            del assignment[v]
+            degree[v] += 1
+        if _rejects_alone(c):
+            for v in dict.fromkeys(c.scope):
+                allowed[v] = unary_mask(c, allowed[v], values, v)
 
     # Build stats list: (var, legal_values, degree)
-    stats = []
-    for v in domains:
-        legal = total_possible_moves[v]
-        degree = len(cons_by_var[v])
-        stats.append((v, legal, degree))
-
-    # Manual selection sort style ordering
-    ordered = []
-    used = set()
-
-    while len(ordered) < len(stats):
-        best_var, best_legal, best_degree = None, None, None
-
-        for var, legal, degree in stats:
-            if var in used:
-                continue
+    stats = [(v, m.bit_count(), degree[v]) for v, m in allowed.items()]
 
-            if best_var is None:
-                best_var, best_legal, best_degree = var, legal, degree
-            else:
-                if tieBreaker:
-                    # MRV + Degree tie-break
-                    if legal < best_legal or (legal == best_legal and degree > best_degree):
-                        best_var, best_legal, best_degree = var, legal, degree
-                else:
-                    # MRV only
-                    if legal < best_legal:
-                        best_var, best_legal, best_degree = var, legal, degree
-
-        ordered.append((best_var, best_legal, best_degree))
-        used.add(best_var)
+    # MRV, optionally with a degree tie-break (sorted() is stable, so remaining ties keep domain order)
+    if tieBreaker:
+        ordered = sorted(stats, key=lambda s: (s[1], -s[2]))
+    else:
+        ordered = sorted(stats, key=lambda s: s[1])
 
     # Extract variable order
     var_order = [var for var, _, _ in ordered]
 
     # Nicely formatted debug print
     print("Variable ordering:")
-    for var, legal, degree in ordered:
+    for var, legal, deg in ordered:
         if tieBreaker:
-            print(f"  {var}: {legal} legal values, degree {degree}")
+            print(f"  {var}: {legal} legal values, degree {deg}")
         else:
             print(f"  {var}: {legal} legal values")
     print("-" * 30 + "\n")
@@ -168,66 +534,560 @@ def print_sudoku(assignment: dict):
         print(" ".join(row_vals))
     print("\n")
 
+# ---------- Numba search kernel (used when numba is installed) ----------
+def _jit(f):
+    return njit(cache=True)(f) if njit is not None else None
+
+_bin_ok_nb = _jit(_bin_ok)
+
+def _solve_nb(masks, assign, order, diff_off, diff_nbr, bin_off, bin_ids, bin_rows,
+              add_off, add_ids, add_rows, values, rem, mark, trail_var, trail_mask, saved_at, ctl, stats):
+    """Resumable iterative forward-checking search over bitmask domains.
+       Returns 1 with `assign` holding a solution (call again to continue), 0 when exhausted.
+       ctl = [depth, trail_top, resuming]; stats = [nodes, branches].
+    """
+    n = order.shape[0]
+    depth = ctl[0]
+    tp = ctl[1]
+    descend = ctl[2] == 0
+    while True:
+        if descend:
+            if depth == n:
+                ctl[0] = n - 1
+                ctl[1] = tp
+                ctl[2] = 1
+                return 1
+            m = masks[order[depth]]
+            rem[depth] = m
+            mark[depth] = tp
+            stats[0] += 1
+            while m:
+                m &= m - 1
+                stats[1] += 1
+            descend = False
+
+        v = order[depth]
+        # undo pruning done by the previous value at this depth
+        while tp > mark[depth]:
+            tp -= 1
+            w = trail_var[tp]
+            masks[w] = trail_mask[tp]
+            saved_at[w] = -1
+        assign[v] = -1
+        if rem[depth] == 0:
+            if depth == 0:
+                ctl[1] = tp
+                return 0
+            depth -= 1
+            continue
+        m = rem[depth]
+        val = 0
+        while (m >> val) & 1 == 0:
+            val += 1
+        rem[depth] = m & (m - 1)
+        assign[v] = val
+
+        # forward check: != neighbours first (one AND each), then binary and add10 rows
+        ok = True
+        drop = ~(1 << val)
+        for j in range(diff_off[v], diff_off[v + 1]):
+            w = diff_nbr[j]
+            old = masks[w]
+            if assign[w] < 0 and (old >> val) & 1:
+                if saved_at[w] != depth:
+                    trail_var[tp] = w
+                    trail_mask[tp] = old
+                    tp += 1
+                    saved_at[w] = depth
+                masks[w] = old & drop
+                if masks[w] == 0:
+                    ok = False
+                    break
+        if ok:
+            for j in range(bin_off[v], bin_off[v + 1]):
+                r = bin_ids[j]
+                x = bin_rows[r, 0]
+                y = bin_rows[r, 1]
+                op = bin_rows[r, 2]
+                if assign[x] >= 0 and assign[y] < 0:
+                    w = y
+                elif assign[y] >= 0 and assign[x] < 0:
+                    w = x
+                else:
+                    continue
+                old = masks[w]
+                keep = old
+                b = 0
+                mm = old
+                while mm:
+                    if mm & 1:
+                        okv = _bin_ok_nb(op, assign[x], b) if w == y else _bin_ok_nb(op, b, assign[y])
+                        if not okv:
+                            keep &= ~(1 << b)
+                    mm >>= 1
+                    b += 1
+                if keep != old:
+                    if saved_at[w] != depth:
+                        trail_var[tp] = w
+                        trail_mask[tp] = old
+                        tp += 1
+                        saved_at[w] = depth
+                    masks[w] = keep
+                    if keep == 0:
+                        ok = False
+                        break
+        if ok:
+            for j in range(add_off[v], add_off[v + 1]):
+                r = add_ids[j]
+                w = -1
+                free = 0
+                for k in range(5):
+                    if assign[add_rows[r, k]] < 0:
+                        w = add_rows[r, k]
+                        free += 1
+                if free != 1:
+                    continue
+                old = masks[w]
+                keep = 0
+                b = 0
+                mm = old
+                while mm:
+                    if mm & 1:
+                        assign[w] = b
+                        if (values[assign[add_rows[r, 0]]] + values[assign[add_rows[r, 1]]]
+                                + values[assign[add_rows[r, 2]]]
+                                == 10 * values[assign[add_rows[r, 4]]] + values[assign[add_rows[r, 3]]]):
+                            keep |= 1 << b
+                    mm >>= 1
+                    b += 1
+                assign[w] = -1
+                if keep != old:
+                    if saved_at[w] != depth:
+                        trail_var[tp] = w
+                        trail_mask[tp] = old
+                        tp += 1
+                        saved_at[w] = depth
+                    masks[w] = keep
+                    if keep == 0:
+                        ok = False
+                        break
+        if ok:
+            depth += 1
+            descend = True
+
+_solve_nb = _jit(_solve_nb)
+
+def _csr(rows: List[List[int]]):
+    off = np.zeros(len(rows) + 1, np.int32)
+    for i, r in enumerate(rows):
+        off[i + 1] = off[i] + len(r)
+    return off, np.array([x for r in rows for x in r], np.int32)
+
+def _encode_for_kernel(csp: CSP, name2idx: Dict[str, int], values: List[int]):
+    """Encode constraints as int32 arrays (and values for add10) for _solve_nb, or None if
+       some kind is unsupported. Unary constraints are skipped: the root pass has already
+       applied them to the masks.
+    """
+    if values and (values[0] < -2**31 or values[-1] >= 2**31):
+        return None
+    n = len(name2idx)
+    differ: List[Dict[int, None]] = [{} for _ in range(n)]
+    bin_rows: List[Tuple[int, int, int]] = []
+    add_rows: List[Tuple[int, ...]] = []
+    for c in csp.constraints:
+        idxs = tuple(name2idx[v] for v in c.scope)
+        distinct = len(set(idxs))
+        if distinct == 1 and c.kind != KIND_ALLDIFF:
+            continue
+        if c.kind in (KIND_ALLDIFF, KIND_NEQ) and distinct == len(idxs):
+            for i in idxs:
+                for j in idxs:
+                    if i != j:
+                        differ[i][j] = None
+        elif c.kind == KIND_BIN and c.opname in _BIN_OPS and distinct == 2:
+            bin_rows.append((idxs[0], idxs[1], _BIN_OPS.index(c.opname)))
+        elif c.kind == KIND_ADD10 and distinct == 5:
+            add_rows.append(idxs)
+        else:
+            return None
+    bin_by_var: List[List[int]] = [[] for _ in range(n)]
+    for r, row in enumerate(bin_rows):
+        bin_by_var[row[0]].append(r); bin_by_var[row[1]].append(r)
+    add_by_var: List[List[int]] = [[] for _ in range(n)]
+    for r, row in enumerate(add_rows):
+        for i in row:
+            add_by_var[i].append(r)
+    diff_off, diff_nbr = _csr([list(d) for d in differ])
+    bin_off, bin_ids = _csr(bin_by_var)
+    add_off, add_ids = _csr(add_by_var)
+    return (diff_off, diff_nbr,
+            bin_off, bin_ids, np.array(bin_rows, np.int32).reshape(-1, 3),
+            add_off, add_ids, np.array(add_rows, np.int32).reshape(-1, 5),
+            np.array(values, np.int64))
+
+def _kernel_solutions(domain_mask: List[int], order_idx: List[int], encoded, idx2name: List[str],
+                      values: List[int], branch_stats: Dict[str, int]) -> Iterable[Assignment]:
+    n, depth_n = len(domain_mask), len(order_idx)
+    masks = np.array(domain_mask, np.uint32)
+    assign = np.full(n, -1, np.int8)
+    order = np.array(order_idx, np.int32)
+    rem = np.zeros(depth_n, np.uint32)
+    mark = np.zeros(depth_n, np.int64)
+    trail_var = np.zeros(n * depth_n + 1, np.int32)
+    trail_mask = np.zeros(n * depth_n + 1, np.uint32)
+    saved_at = np.full(n, -1, np.int64)
+    ctl = np.zeros(3, np.int64)
+    stats = np.zeros(2, np.int64)
+    try:
+        while _solve_nb(masks, assign, order, *encoded, rem, mark,
+                        trail_var, trail_mask, saved_at, ctl, stats):
+            yield {idx2name[i]: values[assign[i]] for i in order_idx}
+    finally:
+        branch_stats["nodes"] = int(stats[0])
+        branch_stats["branches"] = int(stats[1])
+
 # 
 # adding branching factor
-# ---------- Simple solver (BT + forward checking) ----------
+# ---------- Solver (forward checking + conflict-directed backjumping) ----------
+REORDER_EVERY = 10_000  # nodes between adaptive re-sorts of the local checks
+
 def solve_backtracking(csp: CSP, var_order: Optional[List[str]]=None) -> Iterable[Assignment]:
-    
-    domains = {v: list(ds) for v, ds in csp.domains.items()}
-    order = var_order or list(domains.keys())
+    # Intern variables and values to contiguous indices; domains become bitmasks
+    idx2name = list(csp.domains.keys())
+    name2idx = {v: i for i, v in enumerate(idx2name)}
+    n = len(idx2name)
+    order = var_order or idx2name
     print(order)
-    cons_by_var: Dict[str, List[Constraint]] = {v: [] for v in domains}
+    order_idx = [name2idx[v] for v in order]
+    values, val2pos = _intern_values(csp)
+    domain_mask = mask_array([to_mask(val2pos[x] for x in csp.domains[v]) for v in idx2name])
+    hi = max((m.bit_length() - 1 for m in domain_mask), default=0)
+    assignment_arr = array("b" if hi < 128 else "i", [-1]) * n
+
     for c in csp.constraints:
-        for v in c.scope:
-            if v in cons_by_var:
-                cons_by_var[v].append(c)
+        missing = [v for v in c.scope if v not in name2idx]
+        if missing:
+            raise ValueError(f"{c.pretty} uses undeclared variable(s) {missing}")
+    cons = [c.bind(name2idx, values, val2pos) for c in csp.constraints]
+
+    kinds_by_var, args_by_var = _soa_by_var(cons, n)
 
-    assignment: Assignment = {}
+    # != edges (neq, and alldiff taken pairwise) are revised inline by forward checking:
+    # neighbors_by_var[v] holds each such w once. Everything else goes through
+    # Constraint.propagate via others_by_var.
+    neighbors_by_var: List[List[int]] = [[] for _ in range(n)]
+    others_by_var: List[List[Constraint]] = [[] for _ in range(n)]
+    seen_nbr: List[set] = [set() for _ in range(n)]
+    for c in cons:
+        if c.kind == KIND_NEQ or c.kind == KIND_ALLDIFF:
+            for v in c.uidx:
+                for w in c.uidx:
+                    if w != v and w not in seen_nbr[v]:
+                        seen_nbr[v].add(w)
+                        neighbors_by_var[v].append(w)
+        else:
+            for v in c.uidx:
+                others_by_var[v].append(c)
+    # alldiff_used[ci]: values held by the assigned members of alldiff ci
+    alldiff_used = [0] * len(cons)
+    alldiffs_of: List[List[int]] = [[] for _ in range(n)]
+    for ci, c in enumerate(cons):
+        if c.kind == KIND_ALLDIFF and len(c.uidx) == len(c.idx):
+            for i in c.uidx:
+                alldiffs_of[i].append(ci)
+
+    # Adaptive check order: failures are counted per constraint, and every
+    # REORDER_EVERY nodes each variable's rows are re-sorted by (-fail_count, _check_cost)
+    # with the counts halved, so recent failures weigh most.
+    fail_count = array("I", [0]) * len(cons)
+    cost = [_check_cost(c.kind) for c in cons]
 
-    def consistent_with_local(v: str, a: Assignment) -> bool:
-        for c in cons_by_var[v]:
-            if not c.pred(a):
+    def consistent_with_local(v: int) -> bool:
+        a = assignment_arr
+        kinds = kinds_by_var[v]
+        args = args_by_var[v]
+        for j in range(len(kinds)):
+            k = kinds[j]
+            r = 4 * j
+            if k == KIND_NEQ:
+                # v is assigned, so equal values mean both ends are
+                ok = a[args[r]] != a[args[r + 1]]
+            elif k == KIND_ALLDIFF:
+                # one bit test against the values the clique already holds
+                ok = not (alldiff_used[args[r + 3]] >> a[v]) & 1
+            elif k == KIND_IN:
+                ok = (args[r + 1] >> a[v]) & 1 == 1
+            elif k == KIND_BIN:
+                x, y = a[args[r]], a[args[r + 1]]
+                ok = x < 0 or y < 0 or _bin_ok(args[r + 2], x, y)
+            else:
+                ok = cons[args[r + 3]].check_fast(a, v)
+            if not ok:
+                fail_count[args[r + 3]] += 1
                 return False
         return True
 
+    def reorder_checks() -> None:
+        for v in range(n):
+            kinds, args = kinds_by_var[v], args_by_var[v]
+            rows = sorted(range(len(kinds)), key=lambda j: (-fail_count[args[4 * j + 3]], cost[args[4 * j + 3]]))
+            kinds_by_var[v] = array("b", (kinds[j] for j in rows))
+            args_by_var[v] = array("q", (x for j in rows for x in args[4 * j:4 * j + 4]))
+        for ci in range(len(fail_count)):
+            fail_count[ci] >>= 1
+
     branch_stats = {"branches": 0, "nodes": 0}
 
-    def backtrack(idx: int):
-        if idx == len(order):
-            yield dict(assignment)
-            return
-        v = order[idx]
-
-        branch_factor = len(domains[v])
-        branch_stats["branches"] += branch_factor
-        branch_stats["nodes"] += 1
-
-        for val in domains[v]:
-            assignment[v] = val
-            if consistent_with_local(v, assignment):
-                # forward check
-                pruned = []
-                ok = True
-                for w in order[idx+1:]:
-                    removed = []
-                    for vv in list(domains[w]):
-                        assignment[w] = vv
-                        if not consistent_with_local(w, assignment):
-                            domains[w].remove(vv); removed.append(vv)
-                        del assignment[w]
-                    if removed:
-                        pruned.append((w, removed))
-                    if not domains[w]:
-                        ok = False; break
-                if ok:
-                    yield from backtrack(idx+1)
-                # undo pruning
-                for w, removed in pruned:
-                    domains[w].extend(removed)
-            del assignment[v]
-   
-    yield from backtrack(0)
+    def backtrack():
+        # Iterative FC + conflict-directed backjumping (Prosser's FC-CBJ).
+        # trail holds (var, old_mask) for every mask change, at most once per var per level
+        # (saved_at[w] = level of w's newest entry); fc_trail holds the vars whose past_fc
+        # got an entry. Level d undoes by popping both back to the marks taken when it was
+        # entered. rem[d] = values left to try, conf[d] = levels the failures at d depend on,
+        # past_fc[w] = stack of the level tuples whose forward checks pruned w.
+        depth_n = len(order_idx)
+        rem = [0] * depth_n
+        trail: List[Tuple[int, int]] = []
+        fc_trail: List[int] = []
+        trail_mark = [0] * depth_n
+        fc_mark = [0] * depth_n
+        saved_at = [-1] * n
+        conf: List[set] = [set() for _ in range(depth_n)]
+        past_fc: List[List[Tuple[int, ...]]] = [[] for _ in range(n)]
+        level_of = [-1] * n
+        single = [(d,) for d in range(depth_n)]
+
+        def undo(d: int) -> None:
+            mark = trail_mark[d]
+            while len(trail) > mark:
+                w, old = trail.pop()
+                domain_mask[w] = old
+                saved_at[w] = -1
+            mark = fc_mark[d]
+            while len(fc_trail) > mark:
+                past_fc[fc_trail.pop()].pop()
+            v = order_idx[d]
+            if level_of[v] == d:
+                bit = 1 << assignment_arr[v]
+                for ci in alldiffs_of[v]:
+                    alldiff_used[ci] ^= bit
+                level_of[v] = -1
+            assignment_arr[v] = -1
+
+        d = 0
+        enter = True
+        while True:
+            if enter:
+                enter = False
+                if d == depth_n:
+                    yield {idx2name[i]: values[assignment_arr[i]] for i in order_idx}
+                    # keep enumerating: a solution depends on every earlier level
+                    d = depth_n - 1
+                    conf[d].update(range(d))
+                    continue
+                m = domain_mask[order_idx[d]]
+                rem[d] = m
+                conf[d].clear()
+                trail_mark[d] = len(trail)
+                fc_mark[d] = len(fc_trail)
+
+                branch_factor = m.bit_count()
+                branch_stats["branches"] += branch_factor
+                branch_stats["nodes"] += 1
+                if branch_stats["nodes"] % REORDER_EVERY == 0:
+                    reorder_checks()
+
+            v = order_idx[d]
+            undo(d)
+            if not rem[d]:
+                # v is exhausted: jump back to the deepest level it conflicts with
+                cs = conf[d]
+                for culprits in past_fc[v]:
+                    cs.update(culprits)
+                cs.discard(d)
+                if not cs:
+                    return
+                h = max(cs)
+                cs.discard(h)
+                conf[h].update(cs)
+                for j in range(d - 1, h, -1):
+                    undo(j)
+                d = h
+                continue
+
+            low = rem[d] & -rem[d]
+            rem[d] ^= low
+            assignment_arr[v] = low.bit_length() - 1
+            if not consistent_with_local(v):
+                conf[d].update(range(d))
+                continue
+            level_of[v] = d
+            for ci in alldiffs_of[v]:
+                alldiff_used[ci] |= low
+
+            # forward check: only constraints touching v can prune
+            ok = True
+            bit = low
+            for w in neighbors_by_var[v]:
+                m = domain_mask[w]
+                if m & bit and assignment_arr[w] < 0:
+                    if saved_at[w] != d:
+                        trail.append((w, m))
+                        saved_at[w] = d
+                    domain_mask[w] = m ^ bit
+                    past_fc[w].append(single[d])
+                    fc_trail.append(w)
+                    if m == bit:
+                        for culprits in past_fc[w]:
+                            conf[d].update(culprits)
+                        conf[d].discard(d)
+                        ok = False
+                        break
+            if not ok:
+                continue
+            for c in others_by_var[v]:
+                mark = len(trail)
+                ok = c.propagate(domain_mask, assignment_arr, v, trail)
+                pruned = trail[mark:]
+                if pruned:
+                    # re-trail through saved_at: a var already saved at this level keeps
+                    # its older entry, which is the mask undo has to restore
+                    del trail[mark:]
+                    culprits = tuple(level_of[u] for u in c.uidx if level_of[u] >= 0)
+                    for w, old in pruned:
+                        if saved_at[w] != d:
+                            trail.append((w, old))
+                            saved_at[w] = d
+                        past_fc[w].append(culprits)
+                        fc_trail.append(w)
+                if not ok:
+                    if pruned:
+                        for culprits in past_fc[pruned[-1][0]]:
+                            conf[d].update(culprits)
+                        conf[d].discard(d)
+                    else:
+                        conf[d].update(range(d))
+                    break
+            if ok:
+                d += 1
+                enter = True
+
+    # Root pass enforces unary constraints once instead of at every node
+    if all(c.propagate(domain_mask, assignment_arr, -1, []) for c in cons):
+        encoded = _encode_for_kernel(csp, name2idx, values) if _solve_nb is not None and hi < 32 else None
+        if not order_idx:
+            yield {}
+        elif encoded is not None:
+            yield from _kernel_solutions(domain_mask, order_idx, encoded, idx2name, values, branch_stats)
+        else:
+            yield from backtrack()
 
     print(branch_stats)
 
 
+# ---------- Specialized n x n sudoku solver (generated code) ----------
+_SUDOKU_TEMPLATE = '''
+ROW = {rows!r}
+COL = {cols!r}
+BOX = {boxes!r}
+NAMES = {names!r}
+
+def sudoku_solve(masks):
+    row_used = [0] * {n}
+    col_used = [0] * {n}
+    box_used = [0] * {n}
+    vals = [0] * {cells}
+    unfilled = list(range({cells}))
+    stats = {{"branches": 0, "nodes": 0}}
+
+    def search(k):
+        # unfilled[:k] are the open cells; pick the one with fewest candidates
+        if k == 0:
+            yield dict(zip(NAMES, vals))
+            return
+        best = best_pos = -1
+        best_cand = 0
+        best_n = {n} + 1
+        for pos in range(k):
+            cell = unfilled[pos]
+            cand = masks[cell] & ~(row_used[ROW[cell]] | col_used[COL[cell]] | box_used[BOX[cell]])
+            cnt = cand.bit_count()
+            if cnt < best_n:
+                best, best_pos, best_cand, best_n = cell, pos, cand, cnt
+                if cnt <= 1:
+                    break
+        stats["nodes"] += 1
+        stats["branches"] += best_n
+        if best_n == 0:
+            return
+        last = k - 1
+        unfilled[best_pos], unfilled[last] = unfilled[last], unfilled[best_pos]
+        r, c, b = ROW[best], COL[best], BOX[best]
+        cand = best_cand
+        while cand:
+            bit = cand & -cand
+            cand ^= bit
+            row_used[r] |= bit
+            col_used[c] |= bit
+            box_used[b] |= bit
+            vals[best] = bit.bit_length() - 1
+            yield from search(last)
+            row_used[r] ^= bit
+            col_used[c] ^= bit
+            box_used[b] ^= bit
+        unfilled[best_pos], unfilled[last] = unfilled[last], unfilled[best_pos]
+
+    yield from search({cells})
+    print(stats)
+'''
+
+def compile_sudoku(csp: CSP) -> Optional[Callable[..., Iterable[Assignment]]]:
+    """If csp is an n x n sudoku (vars r1c1..rNcN, one alldiff per row, column and box,
+       otherwise only unary constraints), return a solver generated for that shape:
+       one used-values bitmask per row/column/box and the cell -> row/col/box tables
+       baked in as constants. Returns None for any other CSP.
+       The returned solve(csp, var_order=None) picks cells dynamically (fewest candidates
+       first), so var_order is ignored.
+    """
+    cells = len(csp.domains)
+    n = round(cells ** 0.5)
+    b = round(n ** 0.5)
+    if n < 1 or n * n != cells or b * b != n:
+        return None
+    names = [f"r{r}c{c}" for r in range(1, n + 1) for c in range(1, n + 1)]
+    if set(names) != set(csp.domains):
+        return None
+    rows = tuple(i // n for i in range(cells))
+    cols = tuple(i % n for i in range(cells))
+    boxes = tuple((i // n) // b * b + (i % n) // b for i in range(cells))
+    units = set()
+    for key in (rows, cols, boxes):
+        for u in range(n):
+            units.add(frozenset(names[i] for i in range(cells) if key[i] == u))
+    seen = set()
+    for c in csp.constraints:
+        scope = frozenset(c.scope)
+        if c.kind == KIND_ALLDIFF and scope in units and len(c.scope) == n:
+            seen.add(scope)
+        elif len(scope) != 1:
+            return None
+    if seen != units:
+        return None
+
+    ns: Dict[str, object] = {}
+    exec(_SUDOKU_TEMPLATE.format(rows=rows, cols=cols, boxes=boxes, names=tuple(names),
+                                 n=n, cells=cells), ns)
+    sudoku_solve = ns["sudoku_solve"]
+    pos = {name: i for i, name in enumerate(names)}
+
+    def solve(csp: CSP, var_order: Optional[List[str]]=None) -> Iterable[Assignment]:
+        print(f"Using generated {n}x{n} sudoku solver")
+        values, val2pos = _intern_values(csp)
+        masks = [to_mask(val2pos[x] for x in csp.domains[name]) for name in names]
+        for c in csp.constraints:
+            if len(set(c.scope)) == 1:
+                i = pos[c.scope[0]]
+                masks[i] = unary_mask(c, masks[i], values)
+        for sol in sudoku_solve(masks):
+            yield {name: values[p] for name, p in sol.items()}
+    return solve
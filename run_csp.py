@@ -1,36 +1,118 @@
 from cs4300_csp_parser import parse_cs4300
-from cs4300_csp import solve_backtracking, hurrestic
+from cs4300_csp import CSP, solve_backtracking, hurrestic, ac3, compile_sudoku
+from functools import partial
+from multiprocessing import Pool
+from typing import List, Optional
+import contextlib, hashlib, io, json, os
 import time
 
+# hurrestic orderings, keyed on the problem file's contents and the tie-break mode
+ORDER_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "csp_orders")
+# bump when hurrestic or ac3 can produce a different ordering, so old entries stop matching
+ORDER_CACHE_VERSION = 1
+
+
+def cached_hurrestic(path: str, csp: CSP, tieBreaker: bool) -> List[str]:
+    """hurrestic() memoized on disk so repeated runs on the same file skip the preprocessing."""
+    with open(path, "rb") as f:
+        salt = f"\0v{ORDER_CACHE_VERSION}\0{'MVR+' if tieBreaker else 'MVR'}".encode()
+        key = hashlib.sha1(f.read() + salt).hexdigest()
+    cache_path = os.path.join(ORDER_CACHE_DIR, f"{key}.json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            var_order = json.load(f)
+        # anything but a permutation of the variable names is a corrupt entry: recompute
+        if (isinstance(var_order, list) and all(isinstance(v, str) for v in var_order)
+                and sorted(var_order) == sorted(csp.domains)):
+            print(f"Variable ordering: loaded from {cache_path}")
+            return var_order
+    except (OSError, ValueError):
+        pass
+    var_order = hurrestic(csp, tieBreaker)
+    try:
+        os.makedirs(ORDER_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(var_order, f)
+    except OSError:
+        pass  # caching is best effort
+    return var_order
+
+def pick_solver(csp: CSP, sudoku: bool):
+    """The generated sudoku solver if asked for and csp has that shape, else the generic one.
+       The sudoku solver orders cells itself, so it ignores MVR/MVR+ orderings."""
+    return (sudoku and compile_sudoku(csp)) or solve_backtracking
+
+def _solve_branch(path: str, var_order: List[str], v0: str, sudoku: bool, val: int):
+    """Worker: solve the subtree where the first variable v0 is fixed to val.
+       Constraints hold closures and can't be pickled, so each worker re-parses the file."""
+    csp = parse_cs4300(path)
+    csp.domains[v0] = [val]
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not ac3(csp):
+            return []
+        return list(pick_solver(csp, sudoku)(csp, var_order))
+
+def solve_parallel(path: str, csp: CSP, var_order: Optional[List[str]]=None, sudoku: bool=False):
+    """Split the search on the values of one variable; the subtrees are disjoint,
+       so each runs the sequential solver in its own process."""
+    order = var_order or list(csp.domains.keys())
+    # fixed variables (e.g. sudoku givens under MRV) don't split anything, so branch on
+    # the first variable in the order that still has a choice
+    branching = [v for v in order if len(csp.domains[v]) > 1]
+    if not branching or any(not csp.domains[v] for v in order):
+        yield from pick_solver(csp, sudoku)(csp, order)
+        return
+    v0 = branching[0]
+    vals = csp.domains[v0]
+    workers = min(len(vals), os.cpu_count() or 1)
+    print(f"Searching {len(vals)} branches of {v0} on {workers} worker(s)")
+    # leaving the with block terminates the workers, so a caller that stops early (e.g.
+    # after the first solution) doesn't wait for the branches still running
+    with Pool(workers) as pool:
+        for sols in pool.imap_unordered(partial(_solve_branch, path, order, v0, sudoku), vals):
+            yield from sols
 
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) != 2 and len(sys.argv) != 3:
-        print("Usage: python run_csp.py <problem.csp> <var_order>")
+    flags = {"--parallel", "--sudoku"}
+    args = [a for a in sys.argv[1:] if a not in flags]
+    parallel = "--parallel" in sys.argv[1:]
+    sudoku = "--sudoku" in sys.argv[1:]
+    if len(args) != 1 and len(args) != 2:
+        print("Usage: python run_csp.py <problem.csp> <var_order> [--parallel] [--sudoku]")
         sys.exit(1)
-    if len(sys.argv) == 3:
-        var_order = sys.argv[2].upper()
+    if len(args) == 2:
+        var_order = args[1].upper()
     else:
         var_order = "None"
-    csp = parse_cs4300(sys.argv[1])
+    csp = parse_cs4300(args[0])
+    if parallel:
+        def solve(csp: CSP, order: Optional[List[str]]=None):
+            return solve_parallel(args[0], csp, order, sudoku)
+    else:
+        solve = pick_solver(csp, sudoku)
     any_sol = False
     start_time = time.time()
-    if var_order == "MVR":
+    # Shrink domains once before ordering so MRV counts see the propagated domains;
+    # a wiped-out domain means there is nothing to order or search
+    if not ac3(csp):
+        print("AC-3 emptied a domain; skipping search")
+    elif var_order == "MVR":
         start_time_hurrestic = time.time()
-        var_order = hurrestic(csp, False)
+        var_order = cached_hurrestic(args[0], csp, False)
         end_time_hurrestic = time.time()
         print(f"Time taken for hurrestic: {end_time_hurrestic - start_time_hurrestic} seconds")
-        for i, sol in enumerate(solve_backtracking(csp, var_order), 1):
+        for i, sol in enumerate(solve(csp, var_order), 1):
             any_sol = True
             print(f"Solution #{i}: {sol}")
     elif var_order == "MVR+":
-        var_order = hurrestic(csp, True)
-        for i, sol in enumerate(solve_backtracking(csp, var_order), 1):
+        var_order = cached_hurrestic(args[0], csp, True)
+        for i, sol in enumerate(solve(csp, var_order), 1):
             any_sol = True
             print(f"Solution #{i}: {sol}")
     else:
-        for i, sol in enumerate(solve_backtracking(csp), 1):
+        for i, sol in enumerate(solve(csp), 1):
             any_sol = True
             print(f"Solution #{i}: {sol}")
     end_time = time.time()